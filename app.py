@@ -1,15 +1,12 @@
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, render_template, request
+from concurrent.futures import ThreadPoolExecutor
 from flask_cors import CORS
 from rule_engine import analyze_clause_rules
 from chatgpt_service import run_model
-from github_service import GitHubService
-import json
-import PyPDF2
-import docx
-import os
-import re
 
 app = Flask(__name__)
+# Reject oversized request bodies before Werkzeug buffers them
+app.config["MAX_CONTENT_LENGTH"] = 10 * 1024 * 1024
 CORS(app)  # Enable CORS for all routes
 
 # Configure logging
@@ -22,11 +19,16 @@ def index():
 def analyze():
     if request.method == "POST":
         text = request.form.get("contract_text")
-        ai_result = run_model(text)
-        
+        # The rule engine runs while the model call waits on the network. The
+        # worker is per request, so concurrent requests never queue for it.
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            ai_future = pool.submit(run_model, text)
+            rule_result = analyze_clause_rules(text)
+            ai_result = ai_future.result()
+
         return render_template("report.html", 
             ai_result=ai_result,
-            rule_result=analyze_clause_rules(text), 
+            rule_result=rule_result, 
         )
     else:
         return render_template("analyze.html")
@@ -1,7 +1,15 @@
+import copy
+import hashlib
+import itertools
 import json
+import re
+import threading
 import time
-from typing import Dict, Any
-from openai import OpenAI
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Any, List, Optional
+import httpx
+from openai import OpenAI, DefaultHttpxClient, RateLimitError
 
 # Primary and fallback API keys
 API_KEYS = [
@@ -16,21 +24,42 @@ API_KEYS = [
 BASE_URL = "https://api.aimlapi.com/v1"
 MODEL_NAME = "google/gemma-3-12b-it"
 
+# Every key talks to the same host, so all clients share one connection pool
+HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+HTTP_CLIENT = DefaultHttpxClient(limits=HTTP_LIMITS)
 
-def get_client(api_key: str) -> OpenAI:
-    """Initialize and return an OpenAI client with the given API key."""
-    return OpenAI(base_url=BASE_URL, api_key=api_key)
+# Fields the prompt asks for and report.html renders. Replies missing any
+# of them are not cached (see _cache_put).
+REQUIRED_FIELDS = frozenset({
+    "clause_type", "key_terms", "risk_level", "confidence",
+    "summary", "recommendations", "negotiation_script",
+})
 
+COMPLETION_PARAMS = {
+    "model": MODEL_NAME,
+    "temperature": 0.4,
+    "top_p": 0.8,
+    "max_tokens": 600,
+    "timeout": 20,
+}
 
-def run_model(user_message: str) -> Dict[str, Any]:
-    """
-    Sends a legal clause text to the ChatGPT-like API for analysis.
-    Returns a structured JSON with fields:
-    clause_type, key_terms, risk_level, summary, recommendations.
-    """
+# Successful analyses keyed on a digest of the normalized clause text, so
+# boilerplate that differs only in case or spacing is answered without
+# calling the API, and cached entries don't pin whole contracts in memory.
+RESPONSE_CACHE_SIZE = 1024
+_response_cache: "OrderedDict[bytes, Dict[str, Any]]" = OrderedDict()
+_response_cache_lock = threading.Lock()
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Calls start from a rotating key, and keys that hit a rate limit are
+# skipped until their cooldown expires.
+KEY_COOLDOWN_SECONDS = 60
+_key_cooldown_until: Dict[str, float] = {key: 0.0 for key in API_KEYS}
+_key_counter = itertools.count()
 
-    # Notice: no 'f' before triple quotes to prevent {} errors
-    prompt = """
+
+# Notice: no 'f' before triple quotes to prevent {} errors
+RENTAL_ANALYSIS_PROMPT = """
 You are a senior legal expert specializing in **rental home agreements** between landlords and tenants.  
 Your job is to review and analyze the given clause text in the context of **real estate rental contracts** — focusing on fairness, legal clarity, and risk for both parties.
 
@@ -79,32 +108,190 @@ When analyzing, evaluate the clause considering the **core rental agreement prin
 Keep your tone **neutral and professional**, and focus on protecting tenant interests while maintaining fairness.
 """
 
-    # Now safely append the variable
-    prompt += f'\n\nClause text to analyze:\n"""{user_message}"""\n'
 
-    for key in API_KEYS:
+@lru_cache(maxsize=None)
+def get_client(api_key: str) -> OpenAI:
+    """
+    Return the OpenAI client for the given API key.
+    Clients are cached and share HTTP_CLIENT, so TLS connections are reused
+    across calls and across keys. SDK retries are off: a 429 should move on
+    to the next key in _complete, not back off on the same one.
+    """
+    return OpenAI(base_url=BASE_URL, api_key=api_key, http_client=HTTP_CLIENT, max_retries=0)
+
+
+def _build_prompt(user_message: str) -> str:
+    """Build the full analysis prompt for a single clause."""
+    return RENTAL_ANALYSIS_PROMPT + f'\n\nClause text to analyze:\n"""{user_message}"""\n'
+
+
+def _keys_to_try() -> List[str]:
+    """API keys in round-robin order, skipping any that are cooling down."""
+    start = next(_key_counter) % len(API_KEYS)
+    ordered = API_KEYS[start:] + API_KEYS[:start]
+    now = time.monotonic()
+    available = [key for key in ordered if _key_cooldown_until[key] <= now]
+    # If every key is cooling down, try them all rather than fail outright
+    return available or ordered
+
+
+def _mark_rate_limited(key: str) -> None:
+    _key_cooldown_until[key] = time.monotonic() + KEY_COOLDOWN_SECONDS
+
+
+def _cache_key(user_message: str) -> bytes:
+    normalized = _WHITESPACE_RE.sub(" ", user_message).strip().lower()
+    return hashlib.blake2b(normalized.encode(), digest_size=16).digest()
+
+
+def _cache_get(key: bytes) -> Optional[Dict[str, Any]]:
+    with _response_cache_lock:
+        result = _response_cache.get(key)
+        if result is None:
+            return None
+        _response_cache.move_to_end(key)
+    return copy.deepcopy(result)
+
+
+def _cache_put(key: bytes, result: Dict[str, Any]) -> None:
+    # Only cache complete analyses; errors should be retried next time.
+    # _missing_fields goes first because it also handles non-dict replies.
+    if _missing_fields(result) or "error" in result:
+        return
+    with _response_cache_lock:
+        _response_cache[key] = copy.deepcopy(result)
+        _response_cache.move_to_end(key)
+        if len(_response_cache) > RESPONSE_CACHE_SIZE:
+            _response_cache.popitem(last=False)
+
+
+# Characters that can change bracket depth or string state in a JSON reply
+_JSON_STRUCTURE_RE = re.compile(r'[{}\[\]"\\]')
+
+
+class _ReplyBuffer:
+    """
+    Collects a streamed reply and notes where its top-level JSON value
+    closes, so trailing text such as closing code fences is cut off.
+    Brackets are counted as chunks arrive, so each character is scanned
+    once however long the reply is.
+    """
+
+    def __init__(self) -> None:
+        self._parts: List[str] = []
+        self._length = 0
+        self._depth = 0
+        self._started = False
+        self._in_string = False
+        self._escaped_at = -1
+        self._end: Optional[int] = None
+
+    def feed(self, chunk: Any) -> None:
+        """Add a stream chunk. Anything after the JSON value is ignored."""
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if not delta or self._end is not None:
+            return
+        offset = self._length
+        self._parts.append(delta)
+        self._length += len(delta)
+
+        for match in _JSON_STRUCTURE_RE.finditer(delta):
+            pos = offset + match.start()
+            char = match.group()
+            if pos == self._escaped_at:
+                continue
+            if self._in_string:
+                if char == "\\":
+                    self._escaped_at = pos + 1
+                elif char == '"':
+                    self._in_string = False
+            elif char in "{[":
+                self._started = True
+                self._depth += 1
+            elif not self._started:
+                continue
+            elif char == '"':
+                self._in_string = True
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._end = pos + 1
+                    return
+
+    def text(self) -> str:
+        """Return the reply, cut off after the JSON value if it completed."""
+        text = "".join(self._parts)
+        if not text.strip():
+            raise ValueError("Empty response from model")
+        if self._end is not None:
+            text = text[:self._end]
+        return text.strip()
+
+
+def _missing_fields(result: Any) -> List[str]:
+    if not isinstance(result, dict):
+        return sorted(REQUIRED_FIELDS)
+    return sorted(REQUIRED_FIELDS.difference(result))
+
+
+def _parse_response(content: str) -> Any:
+    """Parse the model reply, stripping any markdown code fences."""
+    content = content.strip()
+    try:
+        clean_text = content.replace("```json", "").replace("```", "").strip()
+        print(clean_text)
+        return json.loads(clean_text)
+    except json.JSONDecodeError:
+        return {"error": "Invalid JSON format", "raw": content}
+
+
+def _complete(prompt: str, **params: Any) -> Optional[str]:
+    """
+    Send a prompt to the API, failing over to the next key on any error.
+    Returns the reply text, or None if every key failed.
+    """
+    for key in _keys_to_try():
         try:
             client = get_client(key)
-            response = client.chat.completions.create(
-                model=MODEL_NAME,
+            stream = client.chat.completions.create(
                 messages=[{"role": "user", "content": prompt}],
-                temperature=0.4,
-                top_p=0.8,
-                max_tokens=600,
-                timeout=20,
+                stream=True,
+                **{**COMPLETION_PARAMS, **params},
             )
+            reply = _ReplyBuffer()
+            # Read to the end even once the JSON has closed: closing a partly
+            # read response drops its connection instead of pooling it
+            with stream:
+                for chunk in stream:
+                    reply.feed(chunk)
+            return reply.text()
 
-            content = response.choices[0].message.content.strip()
-
-            try:
-                clean_text = content.replace("```json", "").replace("```", "").strip()
-                print(clean_text)
-                return json.loads(clean_text)
-            except json.JSONDecodeError:
-                return {"error": "Invalid JSON format", "raw": content}
-
+        except RateLimitError as e:
+            _mark_rate_limited(key)
+            print(f"Rate limited on key {key[:5]}...: {e}")
+            continue  # Try next key
         except Exception as e:
             print(f"Error using key {key[:5]}...: {e}")
             continue  # Try next key
 
-    return {"error": "All API calls failed or rate limited."}
+    return None
+
+
+def run_model(user_message: str) -> Dict[str, Any]:
+    """
+    Sends a legal clause text to the ChatGPT-like API for analysis.
+    Returns a structured JSON with fields:
+    clause_type, key_terms, risk_level, summary, recommendations.
+    """
+    cache_key = _cache_key(user_message)
+    cached = _cache_get(cache_key)
+    if cached is not None:
+        return cached
+
+    content = _complete(_build_prompt(user_message))
+    if content is None:
+        return {"error": "All API calls failed or rate limited."}
+
+    result = _parse_response(content)
+    _cache_put(cache_key, result)
+    return result
@@ -1,8 +1,13 @@
+import copy
 import json
+from base64 import b64decode, b64encode
 import os
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Any, List, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Dict, Any, List, Optional, Tuple
 
 class GitHubService:
     def __init__(self, token: str, repo_owner: str, repo_name: str):
@@ -22,8 +27,24 @@ class GitHubService:
             "Authorization": f"token {token}",
             "Accept": "application/vnd.github.v3+json"
         }
+        # url -> (ETag, parsed JSON body) for conditional GETs
+        self._cache: Dict[str, Tuple[str, Any]] = {}
+        # Keep-alive session, pooled for the concurrent fetches in
+        # list_analyses_with_data. Only GETs are retried: a PUT that timed out
+        # may already have been applied.
+        retry = Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=[502, 503, 504],
+            allowed_methods=frozenset({"GET"}),
+            raise_on_status=False,
+        )
+        self._session = requests.Session()
+        self._session.headers.update(self.headers)
+        self._session.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=retry))
 
-    def _make_request(self, method: str, url: str, data: Optional[Dict] = None) -> requests.Response:
+    def _make_request(self, method: str, url: str, data: Optional[Dict] = None,
+                      etag: Optional[str] = None) -> requests.Response:
         """
         Make a request to GitHub API with error handling.
 
@@ -31,6 +52,7 @@ class GitHubService:
             method (str): HTTP method (GET, PUT, etc.).
             url (str): API endpoint URL.
             data (Optional[Dict]): JSON data for POST/PUT requests.
+            etag (Optional[str]): ETag of a cached response; sent as If-None-Match.
 
         Returns:
             requests.Response: The response object.
@@ -38,11 +60,14 @@ class GitHubService:
         Raises:
             Exception: For network errors, rate limits, etc.
         """
+        # Auth headers live on the session; only per-request extras go here
+        headers = {"If-None-Match": etag} if etag else None
+
         try:
             if method.upper() == "GET":
-                response = requests.get(url, headers=self.headers, timeout=30)
+                response = self._session.get(url, headers=headers, timeout=30)
             elif method.upper() == "PUT":
-                response = requests.put(url, headers=self.headers, json=data, timeout=30)
+                response = self._session.put(url, headers=headers, json=data, timeout=30)
             else:
                 raise ValueError(f"Unsupported HTTP method: {method}")
 
@@ -60,9 +85,69 @@ class GitHubService:
         except requests.exceptions.RequestException as e:
             raise Exception(f"Network error: {str(e)}")
 
+    def _get_json(self, url: str) -> Any:
+        """
+        GET a JSON resource, revalidating any cached copy with its ETag.
+        GitHub answers unchanged resources with 304, which has no body and
+        does not count against the rate limit.
+
+        Args:
+            url (str): API endpoint URL.
+
+        Returns:
+            Any: The parsed JSON body.
+        """
+        cached = self._cache.get(url)
+        response = self._make_request("GET", url, etag=cached[0] if cached else None)
+
+        if response.status_code == 304 and cached:
+            return copy.deepcopy(cached[1])
+
+        body = response.json()
+        etag = response.headers.get("ETag")
+        if etag:
+            self._cache[url] = (etag, copy.deepcopy(body))
+        return body
+
+    def _read_file(self, file_path: str) -> Tuple[str, bytes]:
+        """
+        Read a repository file through the contents API.
+
+        Args:
+            file_path (str): Path of the file inside the repository.
+
+        Returns:
+            Tuple[str, bytes]: The file's blob SHA and raw content.
+        """
+        body = self._get_json(f"{self.base_url}/contents/{file_path}")
+        content = body.get("content", "")
+        # Files over 1 MB come back without inline content; fetch the blob
+        if body.get("encoding") != "base64":
+            content = self._get_json(f"{self.base_url}/git/blobs/{body['sha']}")["content"]
+        return body["sha"], b64decode(content)
+
+    @staticmethod
+    def _month_path(analysis_id: str) -> str:
+        # Analysis IDs are %Y%m%d_%H%M%S timestamps
+        return f"contracts/{analysis_id[:4]}-{analysis_id[4:6]}.jsonl"
+
+    def _read_month(self, file_path: str) -> List[Dict[str, Any]]:
+        """
+        Read every analysis stored in a monthly JSONL file.
+
+        Args:
+            file_path (str): Path of the monthly file.
+
+        Returns:
+            List[Dict[str, Any]]: The analyses, each including its analysis_id.
+        """
+        _, content = self._read_file(file_path)
+        return [json.loads(line) for line in content.splitlines() if line.strip()]
+
     def save_analysis(self, analysis_data: Dict[str, Any]) -> str:
         """
-        Save analysis data to GitHub repository as a JSON file.
+        Save analysis data to GitHub repository by appending it to the
+        current month's JSONL file (contracts/YYYY-MM.jsonl).
 
         Args:
             analysis_data (Dict[str, Any]): The analysis data to save.
@@ -72,34 +157,35 @@ class GitHubService:
         """
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         analysis_id = timestamp
-        file_path = f"contracts/{timestamp}/analysis.json"
-
-        # Create the directory structure implicitly by creating the file
+        file_path = self._month_path(analysis_id)
         url = f"{self.base_url}/contents/{file_path}"
 
-        # Check if file exists to get SHA for update
-        sha = None
-        try:
-            existing_response = self._make_request("GET", url)
-            sha = existing_response.json().get("sha")
-        except Exception:
-            # File doesn't exist, which is fine for creation
-            pass
+        record = json.dumps({**analysis_data, "analysis_id": analysis_id}) + "\n"
 
-        # Prepare the content
-        content = json.dumps(analysis_data, indent=2)
-        import base64
-        encoded_content = base64.b64encode(content.encode()).decode()
+        # Another save may update the file between our read and write; GitHub
+        # rejects the stale SHA with 409, so re-read and append again.
+        for attempt in range(3):
+            # Check if file exists to get SHA and current content for the append
+            sha, existing = None, b""
+            try:
+                sha, existing = self._read_file(file_path)
+            except Exception:
+                # File doesn't exist, which is fine for creation
+                pass
 
-        data = {
-            "message": f"Add analysis for {analysis_id}",
-            "content": encoded_content
-        }
-        if sha:
-            data["sha"] = sha
+            data = {
+                "message": f"Add analysis for {analysis_id}",
+                "content": b64encode(existing + record.encode()).decode("ascii")
+            }
+            if sha:
+                data["sha"] = sha
 
-        self._make_request("PUT", url, data)
-        return analysis_id
+            try:
+                self._make_request("PUT", url, data)
+                return analysis_id
+            except Exception as e:
+                if "409" not in str(e) or attempt == 2:
+                    raise
 
     def get_analysis(self, analysis_id: str) -> Dict[str, Any]:
         """
@@ -111,14 +197,59 @@ class GitHubService:
         Returns:
             Dict[str, Any]: The analysis data.
         """
+        try:
+            for analysis in self._read_month(self._month_path(analysis_id)):
+                if analysis.get("analysis_id") == analysis_id:
+                    return analysis
+        except Exception:
+            # No monthly file for that month; the ID may be a legacy one
+            pass
+
+        return self._get_legacy_analysis(analysis_id)
+
+    def _get_legacy_analysis(self, analysis_id: str) -> Dict[str, Any]:
+        """
+        Retrieve an analysis stored in the older one-file-per-analysis layout
+        (contracts/<id>/analysis.json).
+
+        Args:
+            analysis_id (str): The analysis ID (timestamp).
+
+        Returns:
+            Dict[str, Any]: The analysis data, including its analysis_id like
+            records from the monthly files.
+        """
         file_path = f"contracts/{analysis_id}/analysis.json"
         url = f"{self.base_url}/contents/{file_path}"
 
-        response = self._make_request("GET", url)
-        content = response.json()["content"]
-        import base64
-        decoded_content = base64.b64decode(content).decode()
-        return json.loads(decoded_content)
+        content = self._get_json(url)["content"]
+        # json.loads detects the UTF-8 encoding of bytes itself
+        analysis_data = json.loads(b64decode(content))
+        analysis_data["analysis_id"] = analysis_id
+        return analysis_data
+
+    def _list_contracts(self) -> Tuple[List[str], List[str]]:
+        """
+        List the contents of the contracts directory.
+
+        Returns:
+            Tuple[List[str], List[str]]: Legacy per-analysis directory IDs and
+            monthly JSONL file paths.
+        """
+        url = f"{self.base_url}/contents/contracts"
+        try:
+            items = self._get_json(url)
+        except Exception as e:
+            if "404" in str(e) or "not found" in str(e):
+                return [], []  # No contracts directory yet
+            raise
+
+        legacy_ids = [item["name"] for item in items if item["type"] == "dir"]
+        month_files = [
+            item["path"] for item in items
+            if item["type"] == "file" and item["name"].endswith(".jsonl")
+        ]
+        return legacy_ids, month_files
 
     def list_analyses(self) -> List[str]:
         """
@@ -127,42 +258,68 @@ class GitHubService:
         Returns:
             List[str]: List of analysis IDs.
         """
-        url = f"{self.base_url}/contents/contracts"
+        legacy_ids, month_files = self._list_contracts()
+
+        # Legacy IDs are the directory names; only monthly files need reading
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            months = pool.map(self._safe_read_month, month_files)
+            analysis_ids = legacy_ids + [analysis["analysis_id"] for month in months for analysis in month]
+
+        return sorted(analysis_ids, reverse=True)  # Most recent first
+
+    def _safe_get_legacy_analysis(self, analysis_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Retrieve a legacy analysis, returning None instead of raising if it can't be loaded.
+
+        Args:
+            analysis_id (str): The analysis ID (timestamp).
+
+        Returns:
+            Optional[Dict[str, Any]]: The analysis data with its ID, or None.
+        """
         try:
-            response = self._make_request("GET", url)
-            items = response.json()
-            analysis_ids = []
-            for item in items:
-                if item["type"] == "dir":
-                    analysis_ids.append(item["name"])
-            return sorted(analysis_ids, reverse=True)  # Most recent first
+            return self._get_legacy_analysis(analysis_id)
         except Exception as e:
-            if "404" in str(e):
-                return []  # No contracts directory yet
-            raise
+            # Skip analyses that can't be loaded
+            print(f"Warning: Could not load analysis {analysis_id}: {e}")
+            return None
+
+    def _safe_read_month(self, file_path: str) -> List[Dict[str, Any]]:
+        """
+        Read a monthly file, returning an empty list instead of raising.
+
+        Args:
+            file_path (str): Path of the monthly file.
+
+        Returns:
+            List[Dict[str, Any]]: The analyses in the file.
+        """
+        try:
+            return self._read_month(file_path)
+        except Exception as e:
+            print(f"Warning: Could not load analyses from {file_path}: {e}")
+            return []
 
     def list_analyses_with_data(self) -> List[Dict[str, Any]]:
         """
         List all analyses with their full data for dashboard display.
+        Each monthly file is one request; legacy per-analysis files are
+        fetched concurrently alongside them.
 
         Returns:
-            List[Dict[str, Any]]: List of analysis data dictionaries.
+            List[Dict[str, Any]]: List of analysis data dictionaries, most recent first.
         """
-        analysis_ids = self.list_analyses()
-        analyses = []
+        legacy_ids, month_files = self._list_contracts()
+        if not legacy_ids and not month_files:
+            return []
 
-        for analysis_id in analysis_ids:
-            try:
-                analysis_data = self.get_analysis(analysis_id)
-                # Add the ID to the data for reference
-                analysis_data['analysis_id'] = analysis_id
-                analyses.append(analysis_data)
-            except Exception as e:
-                # Skip analyses that can't be loaded
-                print(f"Warning: Could not load analysis {analysis_id}: {e}")
-                continue
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            months = pool.map(self._safe_read_month, month_files)
+            legacy = pool.map(self._safe_get_legacy_analysis, legacy_ids)
+            analyses = [analysis for month in months for analysis in month]
+            analyses += [analysis for analysis in legacy if analysis is not None]
 
-        return analyses
+        return sorted(analyses, key=lambda a: a["analysis_id"], reverse=True)  # Most recent first
 
 # Example usage:
 # service = GitHubService(token="your_token", repo_owner="your_owner", repo_name="your_repo")
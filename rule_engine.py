@@ -1,94 +1,102 @@
-import json
-import re
+import hashlib
+import threading
+from collections import OrderedDict
 
-# Rental Agreement Clause Keywords
+# Rental Agreement Clause Keywords (order sets detection priority)
 CLAUSE_KEYWORDS = {
-    "Rent Payment": ["rent", "monthly payment", "due date", "late fee", "grace period"],
-    "Security Deposit": ["security deposit", "damage deposit", "refundable", "deduct"],
-    "Maintenance and Repairs": ["maintenance", "repairs", "upkeep", "fix", "property damage"],
-    "Utilities and Services": ["utilities", "water", "electricity", "gas", "internet", "garbage"],
-    "Termination": ["terminate", "end of lease", "notice", "vacate"],
-    "Renewal": ["renew", "extension", "automatic renewal", "renewal term"],
-    "Subletting": ["sublet", "assign", "transfer lease"],
-    "Right of Entry": ["entry", "inspect", "landlord access", "visit"],
-    "Pet Policy": ["pet", "animal", "dog", "cat", "pet fee", "deposit"],
-    "Guest Policy": ["guest", "visitor", "overnight stay"],
-    "Property Condition": ["condition", "move-in", "inspection", "damage report"],
-    "Liability and Insurance": ["liability", "insurance", "coverage"],
-    "Default": ["default", "breach", "non-payment", "failure to comply"]
+    "Rent Payment": ("rent", "monthly payment", "due date", "late fee", "grace period"),
+    "Security Deposit": ("security deposit", "damage deposit", "refundable", "deduct"),
+    "Maintenance and Repairs": ("maintenance", "repairs", "upkeep", "fix", "property damage"),
+    "Utilities and Services": ("utilities", "water", "electricity", "gas", "internet", "garbage"),
+    "Termination": ("terminate", "end of lease", "notice", "vacate"),
+    "Renewal": ("renew", "extension", "automatic renewal", "renewal term"),
+    "Subletting": ("sublet", "assign", "transfer lease"),
+    "Right of Entry": ("entry", "inspect", "landlord access", "visit"),
+    "Pet Policy": ("pet", "animal", "dog", "cat", "pet fee", "deposit"),
+    "Guest Policy": ("guest", "visitor", "overnight stay"),
+    "Property Condition": ("condition", "move-in", "inspection", "damage report"),
+    "Liability and Insurance": ("liability", "insurance", "coverage"),
+    "Default": ("default", "breach", "non-payment", "failure to comply")
 }
 
 # High-risk / tenant-unfriendly terms
-HIGH_RISK_TERMS = [
+HIGH_RISK_TERMS = frozenset({
     "unlimited", "no notice", "immediate eviction", "non-refundable",
     "forfeit", "arbitrary", "sole discretion", "without cause", "no liability",
     "penalty", "waive rights", "irrevocable", "final and binding"
-]
+})
 
 # One-sided landlord language
-ONE_SIDED_INDICATORS = [
+ONE_SIDED_INDICATORS = frozenset({
     "tenant shall", "tenant must", "tenant agrees to", "landlord may", "at landlord’s discretion"
-]
+})
 
 # Protective / balanced language
-PROTECTIVE_LANGUAGE = [
+PROTECTIVE_LANGUAGE = frozenset({
     "reasonable", "mutual", "both parties", "written notice", "as required by law",
     "fair", "reciprocal", "limited to", "subject to"
-]
-
-def detect_clause_type(clause_text):
-    clause_lower = clause_text.lower()
-    for clause_type, keywords in CLAUSE_KEYWORDS.items():
-        if any(keyword in clause_lower for keyword in keywords):
+})
+
+# (keyword, clause type) pairs in CLAUSE_KEYWORDS priority order, so detection
+# is one flat loop that stops at the first hit
+KEYWORD_TO_CLAUSE_TYPE = tuple(
+    (keyword, clause_type)
+    for clause_type, keywords in CLAUSE_KEYWORDS.items()
+    for keyword in keywords
+)
+
+def detect_clause_type(clause_lower):
+    for keyword, clause_type in KEYWORD_TO_CLAUSE_TYPE:
+        if keyword in clause_lower:
             return clause_type
     return "Unknown"
 
-def calculate_risk_score(clause_text):
+def find_terms(clause_lower):
+    # Scan each vocabulary once; scoring and flagging both read these hits
+    return {
+        "high_risk": {term for term in HIGH_RISK_TERMS if term in clause_lower},
+        "one_sided": {indicator for indicator in ONE_SIDED_INDICATORS if indicator in clause_lower},
+        "protective": {word for word in PROTECTIVE_LANGUAGE if word in clause_lower},
+    }
+
+def calculate_risk_score(clause_type, hits):
     score = 0
-    clause_lower = clause_text.lower()
 
     # High-risk terms
-    for term in HIGH_RISK_TERMS:
-        if term in clause_lower:
-            score += 2
+    score += 2 * len(hits["high_risk"])
 
     # One-sided language
-    one_sided_count = sum(1 for indicator in ONE_SIDED_INDICATORS if indicator in clause_lower)
-    if one_sided_count > 1:
+    if len(hits["one_sided"]) > 1:
         score += 3
 
     # Missing protective terms
-    protective_count = sum(1 for word in PROTECTIVE_LANGUAGE if word in clause_lower)
-    if protective_count == 0:
+    if not hits["protective"]:
         score += 2
 
     # Adjust for unknown clauses
-    if detect_clause_type(clause_text) == "Unknown":
+    if clause_type == "Unknown":
         score += 1
 
     return min(score, 10)
 
-def generate_flags(clause_text):
+def generate_flags(clause_lower, hits):
     flags = []
-    clause_lower = clause_text.lower()
 
-    if any(term in clause_lower for term in HIGH_RISK_TERMS):
+    if hits["high_risk"]:
         flags.append("Contains high-risk or tenant-unfriendly language")
 
-    one_sided_count = sum(1 for indicator in ONE_SIDED_INDICATORS if indicator in clause_lower)
-    if one_sided_count > 1:
+    if len(hits["one_sided"]) > 1:
         flags.append("Clause appears one-sided in favor of the landlord")
 
-    protective_count = sum(1 for word in PROTECTIVE_LANGUAGE if word in clause_lower)
-    if protective_count == 0:
+    if not hits["protective"]:
         flags.append("No protective or mutual language found")
 
     # Rental-specific red flags
     if "automatic renewal" in clause_lower:
         flags.append("Automatic renewal clause detected — verify tenant consent")
-    if "no notice" in clause_lower:
+    if "no notice" in hits["high_risk"]:
         flags.append("Missing or unfair notice period")
-    if "non-refundable" in clause_lower:
+    if "non-refundable" in hits["high_risk"]:
         flags.append("Non-refundable deposit may be unfair to tenant")
 
     return flags
@@ -106,18 +114,46 @@ def generate_summary(clause_type, risk_score, flags):
         summary += " Key concerns: " + "; ".join(flags) + "."
     return summary
 
-def analyze_clause_rules(clause_text):
-    clause_type = detect_clause_type(clause_text)
-    risk_score = calculate_risk_score(clause_text)
-    flags = generate_flags(clause_text)
+# Re-analyzing the same text (retries, re-runs) is common. Entries are keyed
+# on a digest of the text so the cache doesn't pin whole contracts in memory.
+RULES_CACHE_SIZE = 1024
+_rules_cache = OrderedDict()
+_rules_cache_lock = threading.Lock()
+
+def _analyze(clause_text):
+    clause_lower = clause_text.lower()
+    clause_type = detect_clause_type(clause_lower)
+    hits = find_terms(clause_lower)
+    risk_score = calculate_risk_score(clause_type, hits)
+    flags = generate_flags(clause_lower, hits)
     summary = generate_summary(clause_type, risk_score, flags)
+    return clause_type, risk_score, tuple(flags), summary
+
+def _analyze_clause_rules_cached(clause_text):
+    key = hashlib.blake2b(clause_text.encode(), digest_size=16).digest()
+    with _rules_cache_lock:
+        result = _rules_cache.get(key)
+        if result is not None:
+            _rules_cache.move_to_end(key)
+            return result
+
+    result = _analyze(clause_text)
+    with _rules_cache_lock:
+        _rules_cache[key] = result
+        _rules_cache.move_to_end(key)
+        if len(_rules_cache) > RULES_CACHE_SIZE:
+            _rules_cache.popitem(last=False)
+    return result
 
+def analyze_clause_rules(clause_text):
+    clause_type, risk_score, flags, summary = _analyze_clause_rules_cached(clause_text)
+
+    # Build a fresh dict so callers can't mutate the cached entry
     result = {
         "clause_type": clause_type,
         "risk_score": risk_score,
-        "flags": flags,
+        "flags": list(flags),
         "summary": summary
     }
 
     return result
-